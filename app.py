@@ -1,193 +1,232 @@
-from flask import Flask, render_template_string, Response
+from flask import Flask, Response, send_file
+from multi_agent_ollama import Agent, warm_up
 import requests
-import json
-import subprocess
 import os
+import sys
+import io
+import types
+import unittest
+import traceback
 import re
+import ast
+import threading
+import multiprocessing
+import functools
+import itertools
 
 app = Flask(__name__)
 
 # Helper to extract code from markdown fences
 
+_FENCE_RE = re.compile(r"```(?:python)?\n(.*?)```", re.S)
+
 def extract_code(text: str) -> str:
-    match = re.search(r"```(?:python)?\n(.*?)```", text, re.S)
+    match = _FENCE_RE.search(text)
     if match:
         return match.group(1).strip()
     return text.strip()
 
-# Ollama call
+# Create agents and task
 
-def call_llm(model: str, prompt: str) -> str:
-    url = "http://localhost:11434/api/generate"
-    payload = {"model": model, "prompt": prompt, "maxTokens": 512, "temperature": 0.7, "stream": False}
-    resp = requests.post(url, json=payload)
-    resp.raise_for_status()
-    try:
-        data = resp.json()
-    except ValueError:
-        lines = resp.text.strip().splitlines()
-        data = json.loads(lines[-1])
-    return data.get("response", "").strip()
+# Each stage uses a 4-bit quantized model sized to its job: a coder model for code, a small model for prose and tests
+coder = Agent("Coder", "an expert Python developer who writes clear, efficient code", model="qwen2.5-coder:7b-instruct-q4_K_M", temperature=0, max_tokens=400)
+# Review, tests and docs come from one batched call so the code is only prefilled once
+# Output budget: review 150 + tests 300 + docs 400 tokens
+reviewer = Agent(
+    "Reviewer", "a meticulous code reviewer, Python testing expert and technical writer",
+    model="phi3:mini", temperature=0.2, max_tokens=850,
+    directive="Answer with every requested section, each starting with its <<<MARKER>>> line. Keep prose brief and put code in ```python fences.",
+)
 
-# Agent class
+# Load the agents' models in the background at server startup (not on import, so tests stay offline)
 
-class Agent:
-    def __init__(self, name: str, role: str, model: str = "mistral"):
-        self.name = name
-        self.role = role
-        self.model = model
+def start_warm_up() -> None:
+    threading.Thread(target=warm_up, args=({coder.model, reviewer.model},), daemon=True).start()
 
-    def generate(self, instruction: str) -> str:
-        prompt = f"You are {self.name}, {self.role}.\nInstruction: {instruction}\nProvide only the code (no explanation)."
-        return call_llm(self.model, prompt)
+task = "Write a Python function `reverse_string(input_str: str) -> str` that returns the reversed string."
 
-# Create agents and task
+# Build the generated code and tests as in-memory modules and run them with unittest in a forked child.
+# Forking skips interpreter start-up, keeps the generated module out of the server's sys.modules,
+# and lets a suite that never returns be terminated.
 
-coder = Agent("Coder", "an expert Python developer who writes clear, efficient code")
-tester = Agent("Tester", "a meticulous code reviewer who finds bugs and suggests improvements")
-test_agent = Agent("TestAgent", "a Python testing expert who writes and runs unittest tests")
-documenter = Agent("Documenter", "a technical writer who creates detailed docstrings and examples")
+_FORK = multiprocessing.get_context("fork")
+_TEST_TIMEOUT = 10
 
-task = "Write a Python function `reverse_string(input_str: str) -> str` that returns the reversed string."
+def strip_unittest_main(tests: str) -> ast.Module:
+    # An unguarded top-level unittest.main() would parse the server's argv and exit, so drop it
+    tree = ast.parse(tests, "<tests>")
+    tree.body = [
+        node for node in tree.body
+        if not (isinstance(node, ast.Expr) and isinstance(node.value, ast.Call) and ast.unparse(node.value.func) in ("unittest.main", "main"))
+    ]
+    return tree
+
+def execute_suite(code: str, tests: str, conn) -> None:
+    buf = io.StringIO()
+    try:
+        module = types.ModuleType("reverse_string_module")
+        exec(compile(code, "<coder>", "exec"), module.__dict__)
+        sys.modules["reverse_string_module"] = module
+        test_mod = types.ModuleType("test_reverse_string")
+        exec(compile(strip_unittest_main(tests), "<tests>", "exec"), test_mod.__dict__)
+        suite = unittest.TestLoader().loadTestsFromModule(test_mod)
+        unittest.TextTestRunner(stream=buf).run(suite)
+    except BaseException:
+        # Report SystemExit from sys.exit() like any other error instead of exiting before sending results
+        buf.write(traceback.format_exc())
+    conn.send(buf.getvalue())
+    conn.close()
+
+# The output depends only on the code and tests, so identical runs (e.g. cached Coder output) are served from memory
+@functools.lru_cache(maxsize=128)
+def run_tests(code: str, tests: str) -> str:
+    receiver, sender = _FORK.Pipe(duplex=False)
+    worker = _FORK.Process(target=execute_suite, args=(code, tests, sender), daemon=True)
+    worker.start()
+    sender.close()
+    try:
+        if not receiver.poll(_TEST_TIMEOUT):
+            return f"Tests did not finish within {_TEST_TIMEOUT} seconds; terminated.\n"
+        return receiver.recv()
+    except EOFError:
+        worker.join()
+        return f"Test process exited unexpectedly (exit code {worker.exitcode}).\n"
+    finally:
+        worker.terminate()
+        worker.join()
+        receiver.close()
+
+# Split the reviewer's streamed reply into its <<<SECTION>>>-delimited parts
+
+# Markers may come wrapped in markdown bold (**<<<TESTS>>>**); trailing asterisks only belong to the
+# marker when they close a leading **, so bold text starting a section (<<<DOCS>>>**Note**) is kept
+_SECTION_RE = re.compile(r"(\*\*)?<<<(REVIEW|TESTS|DOCS)>>>(?(1)\*\*)")
+_MARKER_START_RE = re.compile(r"[*<]")
+_SECTION_EVENTS = {"REVIEW": "tester", "TESTS": "testagent", "DOCS": "documenter"}
+_MAX_MARKER_LEN = len("**<<<REVIEW>>>**")
+
+def split_sections(chunks):
+    # Yields (section, delta, False) while a section streams and (section, full_text, True) once it ends.
+    # A reply without any markers is passed through whole as the REVIEW section.
+    current = None
+    parts = []
+    unmarked = []
+    pending = ""
+    for chunk in itertools.chain(chunks, [None]):
+        final = chunk is None
+        if not final:
+            pending += chunk
+        match = _SECTION_RE.search(pending)
+        # A marker's closing "**" may still be on its way, so wait for two more characters before accepting it
+        while match and (final or len(pending) - match.end() >= 2):
+            if current:
+                parts.append(pending[:match.start()])
+                yield current, pending[:match.start()], False
+                yield current, "".join(parts), True
+            current, parts, pending = match.group(2), [], pending[match.end():]
+            match = _SECTION_RE.search(pending)
+        # Hold back a marker still waiting for its closing "**", or a trailing "*" or "<" that may start one
+        if match:
+            # Keep any "**" just before it too, in case the closing pair turns the match into a bold marker
+            cut = match.start()
+            while cut and pending[cut - 1] == "*":
+                cut -= 1
+        else:
+            hold = None if final else _MARKER_START_RE.search(pending, max(0, len(pending) - _MAX_MARKER_LEN + 1))
+            cut = hold.start() if hold else len(pending)
+        if current and cut:
+            parts.append(pending[:cut])
+            yield current, pending[:cut], False
+        elif not current:
+            unmarked.append(pending[:cut])
+        pending = pending[cut:]
+    if current:
+        yield current, "".join(parts), True
+    else:
+        text = "".join(unmarked)
+        yield "REVIEW", text, False
+        yield "REVIEW", text, True
+
+# SSE helpers
+
+def sse_event(event: str, text: str) -> str:
+    # One multi-line data frame per event, so each event is a single write down the WSGI stack.
+    # SSE also treats a bare \r as a line break, so normalize line endings before splitting.
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return f"event: {event}\n" + "".join(f"data: {line}\n" for line in lines) + "\n"
 
 # SSE endpoint
 
 @app.route('/stream')
 def stream():
-    def event_stream():
+    def pipeline():
         # Coder
         yield "event: status\ndata: Coder\n\n"
-        raw_code = coder.generate(task)
-        code = extract_code(raw_code)
-        yield "event: coder\n"
-        for line in code.splitlines():
-            yield f"data: {line}\n"
-        yield "\n"
-
-        # Tester
-        yield "event: status\ndata: Tester\n\n"
-        raw_feedback = tester.generate(f"Review the code and suggest fixes (only output code if patch):\n{code}")
-        feedback = extract_code(raw_feedback)
-        yield "event: tester\n"
-        for line in feedback.splitlines():
-            yield f"data: {line}\n"
-        yield "\n"
-
-        # TestAgent
-        yield "event: status\ndata: TestAgent\n\n"
-        raw_tests = test_agent.generate(f"Write Python unittest tests for this function, including import statements:\n{code}")
-        tests_body = extract_code(raw_tests)
-        # Prepend import of target function
-        tests = f"from reverse_string_module import reverse_string\nimport unittest\n\n{tests_body}"
-        yield "event: testagent\n"
-        for line in tests.splitlines():
-            yield f"data: {line}\n"
-        yield "\n"
-
-        # Write & run tests
-        module_file = "reverse_string_module.py"
-        test_file = "test_reverse_string.py"
-        with open(module_file, "w") as mf:
-            mf.write(code)
-        with open(test_file, "w") as tf:
-            tf.write(tests)
-        result = subprocess.run(["python", "-m", "unittest", test_file], capture_output=True, text=True)
-        os.remove(module_file)
-        os.remove(test_file)
-        results_text = result.stdout + result.stderr
-        yield "event: test_results\n"
-        for line in results_text.splitlines():
-            yield f"data: {line}\n"
-        yield "\n"
-
-        # Documenter
-        yield "event: status\ndata: Documenter\n\n"
-        raw_docs = documenter.generate(f"Write a detailed docstring with examples and edge case descriptions for the following code:\n{code}")
-        docs = extract_code(raw_docs)
-        yield "event: documenter\n"
-        for line in docs.splitlines():
-            yield f"data: {line}\n"
-        yield "\n"
+        chunks = []
+        for chunk in coder.generate(task):
+            chunks.append(chunk)
+            yield sse_event("coder_delta", chunk)
+        code = extract_code("".join(chunks))
+        yield sse_event("coder", code)
+
+        # Tester, TestAgent and Documenter output, batched into one reviewer call
+        yield "event: status\ndata: Tester, TestAgent, Documenter\n\n"
+        instruction = (
+            "For the CODE below, produce three sections, each starting with its marker on its own line:\n"
+            "<<<REVIEW>>> Briefly review the code and suggest fixes (only output code if patch).\n"
+            "<<<TESTS>>> Python unittest tests for this function, including import statements.\n"
+            "<<<DOCS>>> A detailed docstring with examples and edge case descriptions.\n"
+            f"CODE:\n{code}"
+        )
+        tests_produced = False
+        for section, text, finished in split_sections(reviewer.generate(instruction)):
+            event = _SECTION_EVENTS[section]
+            if not finished:
+                if text:
+                    yield sse_event(f"{event}_delta", text)
+                continue
+            output = extract_code(text)
+            if event == "testagent":
+                # Prepend import of target function
+                output = f"from reverse_string_module import reverse_string\nimport unittest\n\n{output}"
+            yield sse_event(event, output)
+
+            # Run the tests as soon as their section closes; docs deltas wait until the run finishes (at most _TEST_TIMEOUT)
+            if event == "testagent":
+                tests_produced = True
+                results_text = run_tests(code, output)
+                yield sse_event("test_results", results_text)
+        if not tests_produced:
+            yield sse_event("test_results", "No tests were produced (the reviewer reply had no <<<TESTS>>> section).")
 
         # Done
         yield "event: status\ndata: Done\n\n"
 
-    return Response(event_stream(), mimetype='text/event-stream')
+    def event_stream():
+        # Report Ollama failures to the page instead of dropping the connection mid-stream
+        try:
+            yield from pipeline()
+        except (requests.RequestException, RuntimeError) as exc:
+            yield sse_event("error", str(exc))
 
-# UI route
+    # Tell nginx and other proxies not to buffer or cache the event stream
+    headers = {"X-Accel-Buffering": "no", "Cache-Control": "no-cache"}
+    return Response(event_stream(), mimetype='text/event-stream', headers=headers)
+
+# UI route (static page; send_file adds ETag/Last-Modified so browsers get 304s)
+
+_INDEX_FILE = os.path.join(app.static_folder, "index.html")
 
 @app.route('/')
 def index():
-    html = '''
-<!DOCTYPE html>
-<html>
-<head>
-  <meta charset="utf-8">
-  <title>Multi-Agent AI Demo</title>
-  <style>
-    body { font-family: sans-serif; margin: 20px; }
-    .grid { display: grid; grid-template-columns: 1fr 1fr; gap: 10px; }
-    .agent { border: 1px solid #ccc; padding: 10px; border-radius: 8px; }
-    pre { white-space: pre-wrap; }
-    button { padding: 8px 12px; margin-bottom: 10px; }
-    #status { margin-bottom: 10px; color: #555; }
-  </style>
-</head>
-<body>
-  <h1>Multi-Agent AI System</h1>
-  <div id="status"></div>
-  <button id="run">Run Agents</button>
-  <div class="grid">
-    <div class="agent"><h2>Coder</h2><pre id="coder"></pre></div>
-    <div class="agent"><h2>Tester</h2><pre id="tester"></pre></div>
-    <div class="agent"><h2>TestAgent</h2><pre id="testagent"></pre></div>
-    <div class="agent"><h2>Test Results</h2><pre id="test_results"></pre></div>
-    <div class="agent" style="grid-column: span 2;"><h2>Documentation</h2><pre id="documenter"></pre></div>
-  </div>
-  <script>
-    document.getElementById('run').onclick = function() {
-      var btn = document.getElementById('run');
-      var status = document.getElementById('status');
-      btn.disabled = true;
-      status.textContent = '⏳ Starting agents...';
-
-      var es = new EventSource('/stream');
-      es.addEventListener('status', function(e) {
-        status.textContent = 'Thinking: ' + e.data;
-      });
-      es.addEventListener('coder', function(e) {
-        document.getElementById('coder').textContent = e.data;
-      });
-      es.addEventListener('tester', function(e) {
-        document.getElementById('tester').textContent = e.data;
-      });
-      es.addEventListener('testagent', function(e) {
-        document.getElementById('testagent').textContent = e.data;
-      });
-      es.addEventListener('test_results', function(e) {
-        document.getElementById('test_results').textContent = e.data;
-      });
-      es.addEventListener('documenter', function(e) {
-        document.getElementById('documenter').textContent = e.data;
-      });
-      es.addEventListener('status', function(e) {
-        if (e.data === 'Done') {
-          status.textContent = '✅ All agents completed';
-          btn.disabled = false;
-          es.close();
-        }
-      });
-      es.onerror = function() {
-        status.textContent = '⚠️ Stream error';
-        btn.disabled = false;
-        es.close();
-      };
-    };
-  </script>
-</body>
-</html>
-'''
-    return render_template_string(html)
+    return send_file(_INDEX_FILE, mimetype='text/html', conditional=True)
+
+# Development server only. For real use, run under gunicorn with threaded workers so long-lived
+# SSE streams don't block each other (settings and the model warm-up hook are in gunicorn.conf.py):
+#   gunicorn app:app
+# Avoid gevent workers: greenlets only switch on I/O, so anything that blocks without yielding
+# (such as run_tests forking the suite and waiting on it) stalls every stream on that worker.
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    start_warm_up()
+    app.run(debug=False)
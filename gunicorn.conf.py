@@ -0,0 +1,11 @@
+# Gunicorn settings, picked up automatically when running `gunicorn app:app` from this directory
+
+# Real OS threads, one per SSE stream, so a blocking step in one stream can't stall the others
+worker_class = "gthread"
+workers = 4
+threads = 8
+
+def post_worker_init(worker):
+    # Threads don't survive fork, so each worker starts its own model warm-up once the app is loaded
+    from app import start_warm_up
+    start_warm_up()
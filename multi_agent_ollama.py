@@ -0,0 +1,116 @@
+import requests
+from requests.adapters import HTTPAdapter
+import orjson
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Shared HTTP session so every agent turn reuses one keep-alive connection to Ollama
+
+_SESSION = requests.Session()
+_SESSION.mount("http://", HTTPAdapter(pool_connections=10, pool_maxsize=10, max_retries=0))
+_SESSION.headers.update({"Connection": "keep-alive", "Accept-Encoding": "gzip"})
+
+# Ollama settings; keep_alive holds models (and their prompt cache) in memory between runs
+
+_OLLAMA_URL = "http://localhost:11434"
+_KEEP_ALIVE = "30m"
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Ollama call, yielding the reply in chunks as tokens are generated
+
+def call_llm(model: str, system: str, prompt: str, temperature: float = 0.7, max_tokens: int = 512):
+    url = f"{_OLLAMA_URL}/api/chat"
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt},
+        ],
+        # Sampling settings must go under "options"; Ollama ignores them at the top level
+        "options": {"temperature": temperature, "num_predict": max_tokens},
+        "stream": True,
+        "keep_alive": _KEEP_ALIVE,
+    }
+    body = orjson.dumps(payload)
+    with _SESSION.post(url, data=body, headers=_JSON_HEADERS, stream=True, timeout=(10, 300)) as resp:
+        resp.raise_for_status()
+        # Ollama streams one JSON object per line
+        for line in resp.iter_lines():
+            if not line:
+                continue
+            data = orjson.loads(line)
+            # Errors can arrive mid-stream with HTTP 200; raise so the partial reply is never cached
+            if data.get("error"):
+                raise RuntimeError(f"Ollama error: {data['error']}")
+            chunk = data.get("message", {}).get("content", "")
+            if chunk:
+                yield chunk
+            if data.get("done"):
+                break
+
+# Response cache for repeatable agent calls, keyed by model, prompt and temperature
+
+_CACHE_MAX_SIZE = 512
+_CACHE_MAX_TEMPERATURE = 0.2
+_RESPONSE_CACHE = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+def cache_key(model: str, system: str, prompt: str, temperature: float, max_tokens: int) -> str:
+    raw = f"{model}\0{system}\0{prompt}\0{temperature}\0{max_tokens}"
+    return hashlib.blake2b(raw.encode()).hexdigest()
+
+def cache_get(key: str):
+    with _CACHE_LOCK:
+        if key not in _RESPONSE_CACHE:
+            return None
+        _RESPONSE_CACHE.move_to_end(key)
+        return _RESPONSE_CACHE[key]
+
+def cache_put(key: str, response: str) -> None:
+    with _CACHE_LOCK:
+        _RESPONSE_CACHE[key] = response
+        _RESPONSE_CACHE.move_to_end(key)
+        while len(_RESPONSE_CACHE) > _CACHE_MAX_SIZE:
+            _RESPONSE_CACHE.popitem(last=False)
+
+# Agent class
+
+class Agent:
+    def __init__(self, name: str, role: str, model: str = "mistral", temperature: float = 0.7, max_tokens: int = 512, deterministic: bool = False, directive: str = "Provide only the code (no explanation)."):
+        self.name = name
+        self.role = role
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        # Only reuse responses when sampling is (near) deterministic or the caller opts in
+        self.cacheable = deterministic or temperature <= _CACHE_MAX_TEMPERATURE
+        # Static persona sent as the system message so Ollama can reuse its prefill
+        self.system = f"You are {name}, {role}.\n{directive}"
+
+    def generate(self, instruction: str):
+        prompt = f"Instruction: {instruction}"
+        if not self.cacheable:
+            yield from call_llm(self.model, self.system, prompt, self.temperature, self.max_tokens)
+            return
+        key = cache_key(self.model, self.system, prompt, self.temperature, self.max_tokens)
+        response = cache_get(key)
+        if response is not None:
+            yield response
+            return
+        chunks = []
+        for chunk in call_llm(self.model, self.system, prompt, self.temperature, self.max_tokens):
+            chunks.append(chunk)
+            yield chunk
+        cache_put(key, "".join(chunks))
+
+# Load models ahead of their first call so it skips the cold load
+
+def warm_up(models) -> None:
+    for model in models:
+        body = orjson.dumps({"model": model, "keep_alive": _KEEP_ALIVE})
+        try:
+            _SESSION.post(f"{_OLLAMA_URL}/api/generate", data=body, headers=_JSON_HEADERS, timeout=(10, 300)).raise_for_status()
+        except requests.RequestException:
+            # Ollama isn't reachable yet; the first real call will load the model instead
+            pass
@@ -0,0 +1,91 @@
+import sys
+import unittest
+from unittest import mock
+
+from app import run_tests, split_sections
+
+REPLY = (
+    "Sure!\n**<<<REVIEW>>>**\nLooks fine, a < b and *args are ok.\n"
+    "<<<TESTS>>>\n```python\nclass T: pass\n```\n"
+    "**<<<DOCS>>>**\nDocs with <tags> and **bold**"
+)
+
+def collect(chunks):
+    deltas, sections = {}, {}
+    for section, text, finished in split_sections(iter(chunks)):
+        if finished:
+            sections[section] = text
+        else:
+            deltas[section] = deltas.get(section, "") + text
+    return deltas, sections
+
+class SplitSectionsTest(unittest.TestCase):
+    def test_sections_and_bold_markers(self):
+        _, sections = collect([REPLY])
+        self.assertEqual(sections, {
+            "REVIEW": "\nLooks fine, a < b and *args are ok.\n",
+            "TESTS": "\n```python\nclass T: pass\n```\n",
+            "DOCS": "\nDocs with <tags> and **bold**",
+        })
+
+    def test_chunk_boundaries(self):
+        _, expected = collect([REPLY])
+        for size in range(1, 17):
+            chunks = [REPLY[i:i + size] for i in range(0, len(REPLY), size)]
+            deltas, sections = collect(chunks)
+            self.assertEqual(sections, expected, f"chunk size {size}")
+            self.assertEqual(deltas, expected, f"chunk size {size}")
+
+    def test_bold_text_after_marker_is_kept(self):
+        reply = "<<<REVIEW>>>ok\n<<<DOCS>>>**Note** docs"
+        for size in range(1, 5):
+            chunks = [reply[i:i + size] for i in range(0, len(reply), size)]
+            _, sections = collect(chunks)
+            self.assertEqual(sections, {"REVIEW": "ok\n", "DOCS": "**Note** docs"}, f"chunk size {size}")
+
+    def test_marker_split_before_closing_bold(self):
+        deltas, sections = collect(["Sure!\n**<<<REVIEW>>>", "**\nok\n*", "*<<<TESTS>>>", "**x"])
+        self.assertEqual(sections, {"REVIEW": "\nok\n", "TESTS": "x"})
+        self.assertEqual(deltas, sections)
+
+    def test_reply_without_markers(self):
+        _, sections = collect(["text without ", "markers"])
+        self.assertEqual(sections, {"REVIEW": "text without markers"})
+
+CODE = "def reverse_string(input_str):\n    return input_str[::-1]\n"
+
+TESTS = (
+    "from reverse_string_module import reverse_string\nimport unittest\n\n"
+    "class ReverseTest(unittest.TestCase):\n"
+    "    def test_reverse(self):\n"
+    "        self.assertEqual(reverse_string('abc'), 'cba')\n"
+)
+
+class RunTestsTest(unittest.TestCase):
+    def setUp(self):
+        run_tests.cache_clear()
+
+    def test_passing_suite(self):
+        self.assertIn("OK", run_tests(CODE, TESTS))
+        self.assertNotIn("reverse_string_module", sys.modules)
+
+    def test_sys_exit_in_code_is_reported(self):
+        results = run_tests("import sys\nsys.exit(1)\n", TESTS)
+        self.assertIn("SystemExit: 1", results)
+
+    def test_unguarded_unittest_main_is_stripped(self):
+        results = run_tests(CODE, TESTS + "\nunittest.main()\n")
+        self.assertIn("Ran 1 test", results)
+        self.assertIn("OK", results)
+
+    def test_syntax_error_in_tests_is_reported(self):
+        self.assertIn("SyntaxError", run_tests(CODE, "def broken(:\n"))
+
+    def test_hanging_suite_times_out(self):
+        with mock.patch("app._TEST_TIMEOUT", 1):
+            results = run_tests("def reverse_string(input_str):\n    while True:\n        pass\n", TESTS)
+        self.assertIn("did not finish", results)
+        self.assertNotIn("reverse_string_module", sys.modules)
+
+if __name__ == '__main__':
+    unittest.main()
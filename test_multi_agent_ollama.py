@@ -0,0 +1,53 @@
+import unittest
+from unittest import mock
+
+import multi_agent_ollama
+from multi_agent_ollama import Agent
+
+def fake_call_llm(model, system, prompt, temperature=0.7, max_tokens=512):
+    yield "reply "
+    yield "text"
+
+class AgentCacheTest(unittest.TestCase):
+    def setUp(self):
+        multi_agent_ollama._RESPONSE_CACHE.clear()
+        patcher = mock.patch("multi_agent_ollama.call_llm", side_effect=fake_call_llm)
+        self.call_llm = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_low_temperature_is_cached(self):
+        agent = Agent("A", "a tester", temperature=0.2)
+        self.assertEqual("".join(agent.generate("go")), "reply text")
+        self.assertEqual("".join(agent.generate("go")), "reply text")
+        self.assertEqual(self.call_llm.call_count, 1)
+
+    def test_high_temperature_is_not_cached(self):
+        agent = Agent("A", "a tester", temperature=0.7)
+        "".join(agent.generate("go"))
+        "".join(agent.generate("go"))
+        self.assertEqual(self.call_llm.call_count, 2)
+
+    def test_deterministic_opts_in(self):
+        agent = Agent("A", "a tester", temperature=0.7, deterministic=True)
+        "".join(agent.generate("go"))
+        "".join(agent.generate("go"))
+        self.assertEqual(self.call_llm.call_count, 1)
+
+    def test_key_includes_prompt_and_settings(self):
+        "".join(Agent("A", "a tester", temperature=0).generate("go"))
+        "".join(Agent("A", "a tester", temperature=0).generate("go again"))
+        "".join(Agent("A", "a tester", temperature=0, max_tokens=100).generate("go"))
+        self.assertEqual(self.call_llm.call_count, 3)
+
+    def test_failed_stream_is_not_cached(self):
+        def failing_call_llm(*args):
+            yield "partial"
+            raise RuntimeError("Ollama error: boom")
+        self.call_llm.side_effect = failing_call_llm
+        agent = Agent("A", "a tester", temperature=0)
+        with self.assertRaises(RuntimeError):
+            "".join(agent.generate("go"))
+        self.assertEqual(len(multi_agent_ollama._RESPONSE_CACHE), 0)
+
+if __name__ == '__main__':
+    unittest.main()